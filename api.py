@@ -1,22 +1,27 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.background import BackgroundTask
 from contextlib import asynccontextmanager
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from datetime import datetime
-from typing import List
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import hashlib
 import logging
 import httpx
 import os
 import random
+import time
 import uvicorn
-import mysql.connector
-from mysql.connector import Error
+import aiomysql
 from dotenv import load_dotenv
 
 
 class MediaData(BaseModel):
-    id: str
+    model_config = ConfigDict(frozen=True)
+
+    id: bytes
     user_id: str
     user_name: str
     resource_id: str
@@ -29,6 +34,13 @@ class Config:
     def __init__(self):
         load_dotenv()
         self._validate_env()
+        self.db_config = {
+            'host': os.getenv('MYSQL_HOST'),
+            'port': int(os.getenv('MYSQL_PORT')),
+            'user': os.getenv('MYSQL_USER'),
+            'password': os.getenv('MYSQL_PASSWORD'),
+            'db': os.getenv('MYSQL_DATABASE')
+        }
 
     def _validate_env(self):
         required = ['MYSQL_HOST', 'MYSQL_PORT', 'MYSQL_USER',
@@ -38,84 +50,223 @@ class Config:
             raise ValueError(
                 f"Missing environment variables: {', '.join(missing)}")
 
-    @property
-    def db_config(self) -> dict:
-        return {
-            'host': os.getenv('MYSQL_HOST'),
-            'port': os.getenv('MYSQL_PORT'),
-            'user': os.getenv('MYSQL_USER'),
-            'password': os.getenv('MYSQL_PASSWORD'),
-            'database': os.getenv('MYSQL_DATABASE')
-        }
-
 
 class DataManager:
     def __init__(self, config: Config):
         self.config = config
-        self.conn = None
-        self.connect()
+        self.pool = None
 
-    def connect(self):
+    async def connect(self):
         try:
-            self.conn = mysql.connector.connect(**self.config.db_config)
-        except Error as e:
+            self.pool = await aiomysql.create_pool(
+                minsize=4,
+                maxsize=20,
+                autocommit=True,
+                **self.config.db_config
+            )
+        except Exception as e:
             logging.error(f"Database connection failed: {e}")
             raise
 
-    async def load_data(self) -> List[MediaData]:
+    async def load_resource_ids(self) -> List[str]:
         try:
-            if not self.conn or not self.conn.is_connected():
-                self.connect()
-
-            cursor = self.conn.cursor(dictionary=True)
-            cursor.execute("SELECT * FROM media_data")
-            rows = cursor.fetchall()
-            cursor.close()
+            async with self.pool.acquire() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute("SELECT resource_id FROM media_data")
+                    rows = await cursor.fetchall()
 
-            return [MediaData(**row) for row in rows]
+            return [row[0] for row in rows]
         except Exception as e:
-            logging.error(f"Error loading data: {e}")
+            logging.error(f"Error loading resource ids: {e}")
             return []
 
-    def remove_media(self, resource_id: str):
+    async def get_media_by_resource_id(self, resource_id: str) -> Optional[MediaData]:
         try:
-            if not self.conn or not self.conn.is_connected():
-                self.connect()
+            async with self.pool.acquire() as conn:
+                async with conn.cursor(aiomysql.DictCursor) as cursor:
+                    await cursor.execute(
+                        "SELECT * FROM media_data WHERE resource_id = %s",
+                        (resource_id,)
+                    )
+                    row = await cursor.fetchone()
+
+            return MediaData(**row) if row else None
+        except Exception as e:
+            logging.error(f"Error loading media {resource_id}: {e}")
+            return None
 
-            cursor = self.conn.cursor()
-            cursor.execute(
-                "DELETE FROM media_data WHERE resource_id = %s",
-                (resource_id,)
-            )
-            self.conn.commit()
-            cursor.close()
+    async def get_stats(self) -> dict:
+        try:
+            async with self.pool.acquire() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(
+                        "SELECT COUNT(*), COUNT(DISTINCT user_name) FROM media_data"
+                    )
+                    total, unique = await cursor.fetchone()
+                    await cursor.execute(
+                        "SELECT DISTINCT user_name FROM media_data"
+                    )
+                    users = await cursor.fetchall()
+
+            return {
+                "total_images": total,
+                "unique_users": unique,
+                "users": [row[0] for row in users]
+            }
+        except Exception as e:
+            logging.error(f"Error loading stats: {e}")
+            return {"total_images": 0, "unique_users": 0, "users": []}
+
+    async def remove_media(self, resource_id: str):
+        try:
+            async with self.pool.acquire() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(
+                        "DELETE FROM media_data WHERE resource_id = %s",
+                        (resource_id,)
+                    )
         except Exception as e:
             logging.error(f"Error removing media: {e}")
             raise
 
-    def close(self):
-        if self.conn:
-            self.conn.close()
+    async def close(self):
+        if self.pool:
+            self.pool.close()
+            await self.pool.wait_closed()
 
 
 class ImageService:
-    def __init__(self):
-        self.client = httpx.AsyncClient(timeout=30.0)
+    BUFFER_LIMIT = 1024 * 1024
+    CHUNK_SIZE = 64 * 1024
+    CACHE_MAX_BYTES = 200 * 1024 * 1024
+    CACHE_TTL = 3600
 
-    async def fetch_image(self, url: str) -> StreamingResponse:
+    def __init__(self):
+        self.client = None
+        self.cache_index: Dict[str, int] = {}
+        self.cache_slots: List[Optional[Tuple[float, bytes, str, str]]] = []
+        self.cache_refs = bytearray()
+        self.cache_free: List[int] = []
+        self.cache_hand = 0
+        self.cache_bytes = 0
+
+    def _get_cached(self, url: str) -> Optional[Tuple[float, bytes, str, str]]:
+        slot = self.cache_index.get(url)
+        if slot is None:
+            return None
+        entry = self.cache_slots[slot]
+        if time.monotonic() - entry[0] >= self.CACHE_TTL:
+            self.invalidate(url)
+            return None
+        self.cache_refs[slot] = 1
+        return entry
+
+    def _store(self, url: str, body: bytes, media_type: str):
+        if len(body) > self.CACHE_MAX_BYTES:
+            return
+        self.invalidate(url)
+        while self.cache_bytes + len(body) > self.CACHE_MAX_BYTES:
+            self._evict_one()
+
+        if self.cache_free:
+            slot = self.cache_free.pop()
+        else:
+            slot = len(self.cache_slots)
+            self.cache_slots.append(None)
+            self.cache_refs.append(0)
+
+        self.cache_slots[slot] = (time.monotonic(), body, media_type, url)
+        self.cache_refs[slot] = 1
+        self.cache_index[url] = slot
+        self.cache_bytes += len(body)
+
+    def _evict_one(self):
+        while True:
+            slot = self.cache_hand
+            self.cache_hand = (slot + 1) % len(self.cache_slots)
+            entry = self.cache_slots[slot]
+            if entry is None:
+                continue
+            if self.cache_refs[slot]:
+                self.cache_refs[slot] = 0
+                continue
+            self.invalidate(entry[3])
+            return
+
+    def invalidate(self, url: str):
+        slot = self.cache_index.pop(url, None)
+        if slot is None:
+            return
+        entry = self.cache_slots[slot]
+        self.cache_slots[slot] = None
+        self.cache_refs[slot] = 0
+        self.cache_free.append(slot)
+        self.cache_bytes -= len(entry[1])
+
+    @staticmethod
+    def _content_length(response: httpx.Response) -> Optional[int]:
+        if response.headers.get("content-encoding", "identity") != "identity":
+            return None
         try:
-            response = await self.client.get(url, follow_redirects=True)
+            length = int(response.headers["content-length"])
+        except (KeyError, ValueError):
+            return None
+        return length if length >= 0 else None
+
+    async def fetch_image(self, url: str, if_none_match: Optional[str] = None) -> Response:
+        etag = f'"{hashlib.md5(url.encode(), usedforsecurity=False).hexdigest()}"'
+        headers = {"Cache-Control": "public, max-age=3600", "ETag": etag}
+        if if_none_match and (
+            if_none_match.strip() == "*"
+            or etag in (tag.strip().removeprefix("W/")
+                        for tag in if_none_match.split(","))
+        ):
+            return Response(status_code=304, headers=headers)
+
+        if cached := self._get_cached(url):
+            _, body, media_type, _ = cached
+            return Response(content=body, media_type=media_type, headers=headers)
+
+        response = None
+        try:
+            request = self.client.build_request("GET", url)
+            response = await self.client.send(
+                request, stream=True, follow_redirects=True)
             response.raise_for_status()
+
+            media_type = response.headers.get("content-type", "image/jpeg")
+            length = self._content_length(response)
+
+            if length is not None and length < self.BUFFER_LIMIT:
+                body = await response.aread()
+                await response.aclose()
+                self._store(url, body, media_type)
+                return Response(
+                    content=body,
+                    media_type=media_type,
+                    headers=headers
+                )
+
+            if length is not None:
+                headers["Content-Length"] = str(length)
+
             return StreamingResponse(
-                response.iter_bytes(),
-                media_type=response.headers.get("content-type", "image/jpeg"),
-                headers={"Cache-Control": "public, max-age=3600"}
+                response.aiter_bytes(chunk_size=self.CHUNK_SIZE),
+                media_type=media_type,
+                headers=headers,
+                background=BackgroundTask(response.aclose)
             )
         except Exception as e:
+            if response is not None:
+                await response.aclose()
             raise HTTPException(status_code=500, detail=str(e))
 
+    def start(self):
+        self.client = httpx.AsyncClient(timeout=30.0)
+
     async def close(self):
-        await self.client.aclose()
+        if self.client:
+            await self.client.aclose()
 
 
 class APIServer:
@@ -123,11 +274,16 @@ class APIServer:
         self.config = Config()
         self.data_manager = DataManager(self.config)
         self.image_service = ImageService()
-        self.media_cache = []
+        self.media_cache = {}
+        self.media_keys = []
+        self.media_lock = asyncio.Lock()
         self.app = self._create_app()
 
     def _create_app(self):
-        app = FastAPI(lifespan=self._lifespan)
+        app = FastAPI(
+            default_response_class=ORJSONResponse,
+            lifespan=self._lifespan
+        )
         app.add_middleware(
             CORSMiddleware,
             allow_origins=["*"],
@@ -140,56 +296,61 @@ class APIServer:
 
     @asynccontextmanager
     async def _lifespan(self, app: FastAPI):
+        await self.data_manager.connect()
+        self.image_service.start()
         try:
             yield
         finally:
             await self.image_service.close()
-            self.data_manager.close()
+            await self.data_manager.close()
+
+    async def _load_media_cache(self):
+        async with self.media_lock:
+            if self.media_keys:
+                return
+            self.media_keys = await self.data_manager.load_resource_ids()
+            self.media_cache = {
+                resource_id: index
+                for index, resource_id in enumerate(self.media_keys)
+            }
+
+    def _discard_cached_media(self, resource_id: str):
+        index = self.media_cache.pop(resource_id, None)
+        if index is None:
+            return
+        last = self.media_keys.pop()
+        if last != resource_id:
+            self.media_keys[index] = last
+            self.media_cache[last] = index
 
     def _add_routes(self, app):
         @app.get("/api/images/random")
         async def get_random_media():
-            if not self.media_cache:
-                self.media_cache = await self.data_manager.load_data()
-                random.shuffle(self.media_cache)
-            if not self.media_cache:
+            if not self.media_keys:
+                await self._load_media_cache()
+            if not self.media_keys:
                 raise HTTPException(404, "No media available")
-            media = random.choice(self.media_cache)
-            return {"data": media.resource_id}
+            return {"data": random.choice(self.media_keys)}
 
         @app.get("/api/images/{image_id}")
-        async def get_media(image_id: str):
-            if not self.media_cache:
-                self.media_cache = await self.data_manager.load_data()
-                random.shuffle(self.media_cache)
-
-            media = next(
-                (m for m in self.media_cache if m.resource_id == image_id),
-                None
-            )
+        async def get_media(image_id: str, request: Request):
+            media = await self.data_manager.get_media_by_resource_id(image_id)
+            self._discard_cached_media(image_id)
             if not media:
                 raise HTTPException(404, "Media not found")
 
-            self.media_cache = [
-                m for m in self.media_cache if m.resource_id != image_id
-            ]
-
-            return await self.image_service.fetch_image(media.resource_url)
+            return await self.image_service.fetch_image(
+                media.resource_url,
+                request.headers.get("if-none-match")
+            )
 
         @app.get("/api/media/stats")
         async def get_stats():
-            data = await self.data_manager.load_data()
-            users = {m.user_name for m in data}
-            return {
-                "total_images": len(data),
-                "unique_users": len(users),
-                "users": list(users)
-            }
+            return await self.data_manager.get_stats()
 
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
-    server = APIServer()
 
     uvicorn.run(
         "api:app",
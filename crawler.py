@@ -3,6 +3,7 @@ from dotenv import load_dotenv
 from typing import List, Optional
 from dataclasses import dataclass
 import os
+import asyncio
 import logging
 from datetime import datetime
 import mysql.connector
@@ -12,7 +13,7 @@ import uuid
 
 @dataclass(frozen=True)
 class MediaItem:
-    id: str
+    id: bytes
     user_id: str
     user_name: str
     resource_id: str
@@ -24,6 +25,20 @@ class Config:
     def __init__(self):
         load_dotenv()
         self._validate_env()
+        self.username = os.getenv('INSTAGRAM_LOGIN_USERNAME')
+        self.password = os.getenv('INSTAGRAM_LOGIN_PASSWORD')
+        self.target_usernames = tuple(
+            os.getenv('INSTAGRAM_USERNAMES', '').split(','))
+        self.new_user_post_limit = int(os.getenv('NEW_USER_POST_LIMIT', '20'))
+        self.existing_user_post_limit = int(
+            os.getenv('EXISTING_USER_POST_LIMIT', '5'))
+        self.db_config = {
+            'host': os.getenv('MYSQL_HOST'),
+            'port': os.getenv('MYSQL_PORT'),
+            'user': os.getenv('MYSQL_USER'),
+            'password': os.getenv('MYSQL_PASSWORD'),
+            'database': os.getenv('MYSQL_DATABASE')
+        }
 
     def _validate_env(self):
         required = ['INSTAGRAM_LOGIN_USERNAME', 'INSTAGRAM_LOGIN_PASSWORD', 'INSTAGRAM_USERNAMES',
@@ -33,38 +48,10 @@ class Config:
             raise ValueError(
                 f"Missing environment variables: {', '.join(missing)}")
 
-    @property
-    def username(self) -> str:
-        return os.getenv('INSTAGRAM_LOGIN_USERNAME')
-
-    @property
-    def password(self) -> str:
-        return os.getenv('INSTAGRAM_LOGIN_PASSWORD')
-
-    @property
-    def target_usernames(self) -> List[str]:
-        return os.getenv('INSTAGRAM_USERNAMES', '').split(',')
-
-    @property
-    def new_user_post_limit(self) -> int:
-        return int(os.getenv('NEW_USER_POST_LIMIT', '20'))
-
-    @property
-    def existing_user_post_limit(self) -> int:
-        return int(os.getenv('EXISTING_USER_POST_LIMIT', '5'))
-
-    @property
-    def db_config(self) -> dict:
-        return {
-            'host': os.getenv('MYSQL_HOST'),
-            'port': os.getenv('MYSQL_PORT'),
-            'user': os.getenv('MYSQL_USER'),
-            'password': os.getenv('MYSQL_PASSWORD'),
-            'database': os.getenv('MYSQL_DATABASE')
-        }
-
 
 class DataManager:
+    INSERT_BATCH_SIZE = 1000
+
     def __init__(self, config: Config):
         self.config = config
         self.conn = None
@@ -76,22 +63,30 @@ class DataManager:
         except Error as e:
             logging.error(f"Database connection failed: {e}")
             raise
+        self._check_schema()
 
-    def get_processed_users(self) -> List[str]:
+    def _check_schema(self):
         cursor = self.conn.cursor()
-        cursor.execute("SELECT user_name FROM processed_users")
-        result = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            "SELECT DATA_TYPE FROM information_schema.COLUMNS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'media_data' "
+            "AND COLUMN_NAME = 'id'"
+        )
+        row = cursor.fetchone()
         cursor.close()
-        return result
+        if not row or row[0].lower() != 'binary':
+            self.conn.close()
+            raise RuntimeError(
+                "media_data.id must be BINARY(16); run db_migrate_media_id.sql")
 
-    def get_existing_resource_ids(self) -> set:
+    def get_processed_users(self) -> List[str]:
         cursor = self.conn.cursor()
-        cursor.execute("SELECT resource_id FROM media_data")
-        result = {row[0] for row in cursor.fetchall()}
+        cursor.execute("SELECT user_name FROM processed_users")
+        result = [row[0] for row in cursor.fetchall()]
         cursor.close()
         return result
 
-    def save_media_items(self, items: List[MediaItem]):
+    def save_media_items(self, items: List[MediaItem]) -> int:
         cursor = self.conn.cursor()
         query = """
             INSERT IGNORE INTO media_data (id, user_id, user_name, resource_id, resource_url, resource_type)
@@ -99,9 +94,13 @@ class DataManager:
         """
         values = [(item.id, item.user_id, item.user_name, item.resource_id, item.resource_url, item.resource_type)
                   for item in items]
-        cursor.executemany(query, values)
-        self.conn.commit()
+        inserted = 0
+        for start in range(0, len(values), self.INSERT_BATCH_SIZE):
+            cursor.executemany(
+                query, values[start:start + self.INSERT_BATCH_SIZE])
+            inserted += cursor.rowcount
         cursor.close()
+        return inserted
 
     def add_processed_user(self, username: str):
         cursor = self.conn.cursor()
@@ -109,15 +108,22 @@ class DataManager:
             "INSERT IGNORE INTO processed_users (user_name) VALUES (%s)",
             (username,)
         )
-        self.conn.commit()
         cursor.close()
 
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
     def close(self):
         if self.conn:
             self.conn.close()
 
 
 class InstagramCrawler:
+    MAX_CONCURRENT_USERS = 4
+
     def __init__(self):
         self.config = Config()
         self.client = Client()
@@ -132,16 +138,26 @@ class InstagramCrawler:
             logging.error(f"Login failed: {e}")
             return False
 
-    def process_user(self, username: str, is_processed: bool) -> Optional[List[MediaItem]]:
+    def _worker_clients(self) -> List[Client]:
+        settings = self.client.get_settings()
+        clients = []
+        for _ in range(self.MAX_CONCURRENT_USERS):
+            client = Client()
+            client.set_settings(settings)
+            clients.append(client)
+        return clients
+
+    def process_user(self, client: Client, username: str,
+                     is_processed: bool) -> Optional[List[MediaItem]]:
         try:
-            user_id = self.client.user_id_from_username(username)
+            user_id = client.user_id_from_username(username)
             limit = (self.config.existing_user_post_limit if is_processed
                      else self.config.new_user_post_limit)
 
-            medias = self.client.user_medias(user_id, limit)
+            medias = client.user_medias(user_id, limit)
             return [
                 MediaItem(
-                    id=str(uuid.uuid4()),
+                    id=uuid.uuid4().bytes,
                     user_id=str(media.id),
                     user_name=username,
                     resource_id=str(resource.pk),
@@ -155,27 +171,52 @@ class InstagramCrawler:
             logging.error(f"Error processing user {username}: {e}")
             return None
 
-    def run(self):
-        if not self.login():
-            return
-
-        processed_users = self.db_manager.get_processed_users()
-        existing_ids = self.db_manager.get_existing_resource_ids()
-
-        for username in self.config.target_usernames:
-            if items := self.process_user(username, username in processed_users):
-                new_items = [item for item in items
-                             if item.resource_id not in existing_ids]
-
-                if new_items:
-                    self.db_manager.save_media_items(new_items)
+    async def run(self):
+        try:
+            if not self.login():
+                return
+
+            processed_users = self.db_manager.get_processed_users()
+            all_items: List[MediaItem] = []
+            clients: asyncio.Queue[Client] = asyncio.Queue()
+            for client in self._worker_clients():
+                clients.put_nowait(client)
+
+            async def fetch(username: str) -> Optional[List[MediaItem]]:
+                client = await clients.get()
+                try:
+                    return await asyncio.to_thread(
+                        self.process_user, client, username,
+                        username in processed_users)
+                finally:
+                    clients.put_nowait(client)
+
+            results = await asyncio.gather(
+                *(fetch(username) for username in self.config.target_usernames))
+
+            for username, items in zip(self.config.target_usernames, results):
+                if items:
+                    all_items.extend(items)
                     logging.info(
-                        f"Added {len(new_items)} new media from {username}")
+                        f"Fetched {len(items)} media from {username}")
+
+                    if username not in processed_users:
+                        self.db_manager.add_processed_user(username)
 
-                if username not in processed_users:
-                    self.db_manager.add_processed_user(username)
+            if all_items:
+                added = self.db_manager.save_media_items(all_items)
+                logging.info(f"Added {added} new media")
 
-        self.db_manager.close()
+            self.db_manager.commit()
+        except Exception as e:
+            logging.error(f"Crawl failed, rolling back: {e}")
+            try:
+                self.db_manager.rollback()
+            except Exception as rollback_error:
+                logging.error(f"Rollback failed: {rollback_error}")
+            raise
+        finally:
+            self.db_manager.close()
 
 
 def setup_logging():
@@ -193,7 +234,7 @@ def setup_logging():
 def main():
     setup_logging()
     crawler = InstagramCrawler()
-    crawler.run()
+    asyncio.run(crawler.run())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,14 @@
+-- Converts media_data.id from CHAR(36) to BINARY(16) on databases created
+-- from an older db.sql. Requires MySQL 8.0+ (UUID_TO_BIN).
+
+ALTER TABLE media_data ADD COLUMN id_bin BINARY(16) NULL FIRST;
+
+UPDATE media_data SET id_bin = UUID_TO_BIN(id);
+
+ALTER TABLE media_data
+    DROP PRIMARY KEY,
+    DROP COLUMN id;
+
+ALTER TABLE media_data
+    CHANGE COLUMN id_bin id BINARY(16) NOT NULL FIRST,
+    ADD PRIMARY KEY (id);